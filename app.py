@@ -1,6 +1,10 @@
 from flask import Flask, request, jsonify, session
 from flask_cors import CORS
+from rendering import RenderQueueFull, get_pipeline
+import gc
+import os
 import secrets
+import threading
 import uuid
 from datetime import datetime
 from typing import Dict, List, Optional
@@ -358,6 +362,62 @@ questionnaire_templates = {
     }
 }
 
+# Keyword lists used to route a free-text symptom to a template, in priority order
+symptom_keywords = {
+    'stomach': ['stomach', 'belly', 'abdomen', 'tummy', 'digestive', 'gastric'],
+    'headache': ['head', 'headache', 'migraine', 'temple'],
+    'fever': ['fever', 'temperature', 'hot', 'feverish'],
+    'cough': ['cough', 'coughing', 'throat', 'respiratory']
+}
+
+# Answers that add to the risk score (compared lower-cased)
+high_risk_answers = ('yes', 'severe', 'more than 3 days', 'above 103°f', '7-9 (severe)', '10 (unbearable)')
+
+# Read-only tables built once by create_app() (in the gunicorn master when preloading)
+compiled_templates: Optional[Dict[str, dict]] = None
+keyword_index: Optional[tuple] = None
+home_payload: Optional[str] = None
+_build_lock = threading.Lock()
+
+def compile_templates(templates: Dict[str, dict]) -> Dict[str, dict]:
+    """Freeze templates into tuples, filling in the default yes/no options"""
+    def compile_question(question):
+        compiled = dict(question)
+        compiled['options'] = tuple(question.get('options', ['Yes', 'No']))
+        return compiled
+
+    compiled = {}
+    for key, template in templates.items():
+        compiled[key] = {
+            'initial_questions': tuple(
+                compile_question(q) for q in template.get('initial_questions', [])
+            ),
+            'conditional_questions': {
+                question_id: {
+                    answer: tuple(compile_question(q) for q in questions)
+                    for answer, questions in branches.items()
+                }
+                for question_id, branches in template.get('conditional_questions', {}).items()
+            }
+        }
+    return compiled
+
+def build_keyword_index(keywords: Dict[str, List[str]]) -> tuple:
+    """Flatten the keyword lists into (template key, keywords) pairs"""
+    return tuple((key, tuple(words)) for key, words in keywords.items())
+
+def find_template(symptom: str) -> dict:
+    """Resolve a free-text symptom to its compiled template"""
+    if compiled_templates is None:
+        create_app()
+    symptom = symptom.lower()
+    for key, keywords in keyword_index:
+        if any(word in symptom for word in keywords):
+            return compiled_templates[key]
+    
+    # Default to stomach if no match
+    return compiled_templates['stomach']
+
 class QuestionnaireSession:
     def __init__(self, session_id: str, symptom: str, initial_description: str):
         self.session_id = session_id
@@ -367,30 +427,23 @@ class QuestionnaireSession:
         self.current_index = 0
         self.answers = {}
         self.completed = False
+        # Bumped whenever an answer changes so rendered artifacts can be cached per version
+        self.version = 0
+        # Read-only handle for shared artifacts; the session id itself must never leave the patient
+        self.share_token = secrets.token_urlsafe(16)
         self.start_time = datetime.now()
+        self.template = self._get_template()
         self._build_questions()
     
     def _build_questions(self):
         """Build the complete question list based on symptom"""
-        template = self._get_template()
-        if template:
-            self.questions = template.get('initial_questions', [])
+        if self.template:
+            # Copy so conditional inserts never touch the shared template
+            self.questions = list(self.template.get('initial_questions', ()))
     
     def _get_template(self):
         """Get the appropriate questionnaire template"""
-        symptom_keywords = {
-            'stomach': ['stomach', 'belly', 'abdomen', 'tummy', 'digestive', 'gastric'],
-            'headache': ['head', 'headache', 'migraine', 'temple'],
-            'fever': ['fever', 'temperature', 'hot', 'feverish'],
-            'cough': ['cough', 'coughing', 'throat', 'respiratory']
-        }
-        
-        for key, keywords in symptom_keywords.items():
-            if any(word in self.symptom.lower() for word in keywords):
-                return questionnaire_templates.get(key)
-        
-        # Default to stomach if no match
-        return questionnaire_templates.get('stomach')
+        return find_template(self.symptom)
     
     def get_current_question(self):
         """Get the current question"""
@@ -399,7 +452,7 @@ class QuestionnaireSession:
             return {
                 'question': question['question'],
                 'type': question['type'],
-                'options': question.get('options', ['Yes', 'No']),
+                'options': question['options'],
                 'current': self.current_index + 1,
                 'total': len(self.questions),
                 'progress': ((self.current_index + 1) / len(self.questions)) * 100
@@ -411,6 +464,7 @@ class QuestionnaireSession:
         if self.current_index < len(self.questions):
             question_id = self.questions[self.current_index]['id']
             self.answers[question_id] = answer
+            self.version += 1
             
             # Check for conditional questions
             self._add_conditional_questions(question_id, answer)
@@ -420,7 +474,7 @@ class QuestionnaireSession:
     
     def _add_conditional_questions(self, question_id: str, answer: str):
         """Add conditional questions based on answer"""
-        template = self._get_template()
+        template = self.template
         if template and 'conditional_questions' in template:
             conditionals = template['conditional_questions'].get(question_id, {})
             if answer.lower() in conditionals:
@@ -450,13 +504,12 @@ class QuestionnaireSession:
         if self.current_index < len(self.questions):
             question_id = self.questions[self.current_index]['id']
             self.answers[question_id] = 'Skipped'
+            self.version += 1
             return self.next_question()
         return False
     
     def generate_report(self):
         """Generate comprehensive report"""
-        template = self._get_template()
-        
         # Analyze answers for risk assessment
         risk_score = 0
         recommendations = []
@@ -467,7 +520,7 @@ class QuestionnaireSession:
             weight = question.get('weight', 'low')
             
             # Calculate risk based on certain answers
-            if answer.lower() in ['yes', 'severe', 'more than 3 days', 'above 103°f', '7-9 (severe)', '10 (unbearable)']:
+            if answer.lower() in high_risk_answers:
                 if weight == 'high':
                     risk_score += 3
                 elif weight == 'medium':
@@ -550,7 +603,7 @@ class QuestionnaireSession:
             'risk_score': risk_score,
             'recommendations': recommendations,
             'suggested_medications': medications,
-            'answers': self.answers,
+            'answers': dict(self.answers),
             'detailed_answers': [
                 {
                     'question': q['question'],
@@ -561,24 +614,61 @@ class QuestionnaireSession:
             'disclaimer': 'This assessment is for informational purposes only and does not replace professional medical advice. Please consult a healthcare provider for proper diagnosis and treatment.'
         }
 
+def apply_action(session: QuestionnaireSession, answer: Optional[str], action: str = 'next'):
+    """Apply a /submit_answer request (next, previous or skip) to a session"""
+    # Submit answer if not navigating back
+    if action != 'previous':
+        session.submit_answer(answer)
+    
+    # Handle navigation
+    if action == 'next':
+        return session.next_question()
+    elif action == 'previous':
+        return session.previous_question()
+    elif action == 'skip':
+        return session.skip_question()
+    return True
+
+def shareable_report(session: QuestionnaireSession, share_url: str) -> dict:
+    """Report snapshot for shared artifacts: the session id is swapped for a read-only link"""
+    report = session.generate_report()
+    del report['session_id']
+    report['share_url'] = share_url
+    return report
+
 # Session storage
 sessions: Dict[str, QuestionnaireSession] = {}
+# Share token -> session id, for the read-only /shared_report view
+share_tokens: Dict[str, str] = {}
+
+# Set by create_app() when AUSHADHAM_RECORD names an event log file
+recorder = None
+
+HOME_INFO = {
+    "status": "Medical Questionnaire API is running!",
+    "version": "3.0",
+    "endpoints": [
+        "/start_questionnaire",
+        "/submit_answer", 
+        "/next_question",
+        "/previous_question",
+        "/skip_question",
+        "/get_current_question",
+        "/get_report"
+    ]
+}
+
+@app.after_request
+def record_session_event(response):
+    if recorder is not None:
+        recorder.record(request, response)
+    return response
 
 @app.route("/", methods=["GET"])
 def home():
-    return jsonify({
-        "status": "Medical Questionnaire API is running!",
-        "version": "3.0",
-        "endpoints": [
-            "/start_questionnaire",
-            "/submit_answer", 
-            "/next_question",
-            "/previous_question",
-            "/skip_question",
-            "/get_current_question",
-            "/get_report"
-        ]
-    })
+    if home_payload is None:
+        create_app()
+    return app.response_class(home_payload, mimetype='application/json')
 
 @app.route("/start_questionnaire", methods=["POST"])
 def start_questionnaire():
@@ -593,6 +683,7 @@ def start_questionnaire():
         # Create new questionnaire session
         session = QuestionnaireSession(session_id, symptom, initial_description)
         sessions[session_id] = session
+        share_tokens[session.share_token] = session_id
         
         # Get first question
         first_question = session.get_current_question()
@@ -619,19 +710,7 @@ def submit_answer():
         
         session = sessions[session_id]
         
-        # Submit answer if not navigating back
-        if action != 'previous':
-            session.submit_answer(answer)
-        
-        # Handle navigation
-        if action == 'next':
-            has_next = session.next_question()
-        elif action == 'previous':
-            has_next = session.previous_question()
-        elif action == 'skip':
-            has_next = session.skip_question()
-        else:
-            has_next = True
+        apply_action(session, answer, action)
         
         # Check if questionnaire is completed
         if session.completed:
@@ -695,13 +774,106 @@ def get_report():
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 400
 
+@app.route("/render_report", methods=["POST"])
+def render_report():
+    try:
+        data = request.json
+        session_id = data.get('session_id')
+        fmt = data.get('format', 'html')
+        
+        if session_id not in sessions:
+            return jsonify({'success': False, 'error': 'Invalid session'}), 404
+        
+        session = sessions[session_id]
+        
+        share_url = f"{request.host_url}shared_report/{session.share_token}"
+        
+        # Rendering happens on the pool; only the report snapshot is built here
+        job = get_pipeline().submit(session_id, session.version, fmt,
+                                    lambda: shareable_report(session, share_url))
+        
+        return jsonify({
+            'success': True,
+            'job_id': job['job_id'],
+            'status': job['status']
+        }), 202
+    except RenderQueueFull as e:
+        return jsonify({'success': False, 'error': str(e)}), 503
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+@app.route("/get_render", methods=["POST"])
+def get_render():
+    try:
+        data = request.json
+        job = get_pipeline().get(data.get('job_id'))
+        
+        if job is None:
+            return jsonify({'success': False, 'error': 'Invalid job'}), 404
+        
+        return jsonify({
+            'success': True,
+            'job': job
+        })
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+@app.route("/shared_report/<token>", methods=["GET"])
+def shared_report(token):
+    try:
+        session_id = share_tokens.get(token)
+        
+        if session_id not in sessions:
+            return jsonify({'success': False, 'error': 'Invalid share link'}), 404
+        
+        report = sessions[session_id].generate_report()
+        del report['session_id']
+        
+        return jsonify({
+            'success': True,
+            'report': report
+        })
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+@app.route("/render_metrics", methods=["GET"])
+def render_metrics():
+    return jsonify(get_pipeline().metrics())
+
 @app.route("/health_check", methods=["GET"])
 def health_check():
     return jsonify({
         'status': 'healthy',
         'active_sessions': len(sessions),
+        'render_queue_depth': get_pipeline().metrics()['queue_depth'],
         'timestamp': datetime.now().isoformat()
     })
 
+def create_app():
+    """Build the shared read-only tables once and return the app.
+
+    Under gunicorn with preload_app this runs in the master, so workers inherit
+    the tables through fork instead of rebuilding them (see gunicorn.conf.py).
+    """
+    global compiled_templates, keyword_index, home_payload, recorder
+    # Threaded servers can reach here from several requests at once
+    with _build_lock:
+        if compiled_templates is None:
+            templates = compile_templates(questionnaire_templates)
+            keyword_index = build_keyword_index(symptom_keywords)
+            home_payload = app.json.dumps(HOME_INFO) + "\n"
+            # Assigned last: find_template() treats it as "everything is built"
+            compiled_templates = templates
+        record_path = os.environ.get('AUSHADHAM_RECORD')
+        if record_path and recorder is None:
+            from replay import SessionRecorder
+            recorder = SessionRecorder(record_path)
+    return app
+
+def freeze_shared_state():
+    """Move everything allocated so far into the GC's permanent generation
+    so collections in forked workers never write to the inherited pages"""
+    gc.freeze()
+
 if __name__ == "__main__":
-    app.run(debug=True)
+    create_app().run(debug=True)
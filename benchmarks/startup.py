@@ -0,0 +1,172 @@
+"""Measure gunicorn startup cost for the Flask backend.
+
+Reports time to first successful request, per-worker RSS/PSS after some
+traffic, and the time to scale from 1 to N workers (via SIGTTIN). A worker
+counts as up once gunicorn's post_worker_init hook has run, i.e. after it
+has loaded the app, so legacy workers are charged for importing app.py.
+
+    python benchmarks/startup.py --workers 4            # preload + gc.freeze
+    python benchmarks/startup.py --workers 4 --legacy   # each worker imports app.py
+
+Linux only (reads /proc).
+"""
+import argparse
+import json
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+READY_HOOK = '''
+def post_worker_init(worker):
+    with open({path!r}, 'a') as ready:
+        ready.write(str(worker.pid) + '\\n')
+'''
+
+
+def write_config(directory: str, legacy: bool):
+    """Write a gunicorn config that logs each worker's pid once it has loaded the app.
+
+    Returns (config path, ready file path). Preload mode extends the
+    repo's gunicorn.conf.py; legacy mode uses gunicorn's defaults.
+    """
+    ready_path = os.path.join(directory, 'ready')
+    open(ready_path, 'w').close()
+    settings = ''
+    if not legacy:
+        with open(os.path.join(ROOT, 'gunicorn.conf.py')) as conf:
+            settings = conf.read()
+    config_path = os.path.join(directory, 'gunicorn.conf.py')
+    with open(config_path, 'w') as config:
+        config.write(settings + READY_HOOK.format(path=ready_path))
+    return config_path, ready_path
+
+
+def gunicorn_command(port: int, workers: int, legacy: bool, config_path: str):
+    command = [sys.executable, '-m', 'gunicorn', '--bind', f'127.0.0.1:{port}',
+               '--workers', str(workers), '--config', config_path]
+    return command + ['app:app' if legacy else 'app:create_app()']
+
+
+def wait_for_workers(ready_path: str, count: int, timeout: float = 30.0):
+    """Block until count workers have finished loading the app"""
+    started = time.perf_counter()
+    while time.perf_counter() - started < timeout:
+        with open(ready_path) as ready:
+            if len(ready.read().split()) >= count:
+                return
+        time.sleep(0.002)
+    raise RuntimeError('workers did not boot in time')
+
+
+def wait_for_first_request(port: int, timeout: float = 30.0):
+    """Poll /health_check until it answers; return seconds waited"""
+    started = time.perf_counter()
+    while time.perf_counter() - started < timeout:
+        try:
+            with urllib.request.urlopen(f'http://127.0.0.1:{port}/health_check', timeout=1) as response:
+                if response.status == 200:
+                    return time.perf_counter() - started
+        except OSError:
+            time.sleep(0.01)
+    raise RuntimeError('server did not answer in time')
+
+
+def worker_pids(master_pid: int):
+    with open(f'/proc/{master_pid}/task/{master_pid}/children') as children:
+        return [int(pid) for pid in children.read().split()]
+
+
+def memory_kb(pid: int):
+    """Return (rss, pss) in kB for a process"""
+    values = {}
+    with open(f'/proc/{pid}/smaps_rollup') as rollup:
+        for line in rollup:
+            key, _, rest = line.partition(':')
+            if key in ('Rss', 'Pss'):
+                values[key] = int(rest.split()[0])
+    return values.get('Rss', 0), values.get('Pss', 0)
+
+
+def drive_traffic(port: int, requests: int):
+    """Start questionnaires so every worker touches the shared tables.
+
+    Sessions live in one worker's memory, so only stateless calls are made.
+    """
+    for i in range(requests):
+        symptom = ('stomach', 'headache', 'fever', 'cough')[i % 4]
+        request = urllib.request.Request(
+            f'http://127.0.0.1:{port}/start_questionnaire',
+            data=json.dumps({'symptom': symptom}).encode(),
+            headers={'Content-Type': 'application/json'})
+        with urllib.request.urlopen(request) as response:
+            response.read()
+        with urllib.request.urlopen(f'http://127.0.0.1:{port}/') as response:
+            response.read()
+
+
+def measure(workers: int, legacy: bool, port: int, requests: int, directory: str):
+    config_path, ready_path = write_config(directory, legacy)
+    started = time.perf_counter()
+    server = subprocess.Popen(gunicorn_command(port, workers, legacy, config_path), cwd=ROOT,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_for_first_request(port)
+        cold_start = time.perf_counter() - started
+        wait_for_workers(ready_path, workers)
+        drive_traffic(port, requests)
+        usage = [memory_kb(pid) for pid in worker_pids(server.pid)]
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait()
+    return cold_start, usage
+
+
+def measure_scale_up(workers: int, legacy: bool, port: int, directory: str):
+    config_path, ready_path = write_config(directory, legacy)
+    server = subprocess.Popen(gunicorn_command(port, 1, legacy, config_path), cwd=ROOT,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_for_first_request(port)
+        wait_for_workers(ready_path, 1)
+        started = time.perf_counter()
+        # Signals sent back to back coalesce, so add one worker at a time
+        # and wait until it has loaded the app before asking for the next
+        for count in range(2, workers + 1):
+            server.send_signal(signal.SIGTTIN)
+            wait_for_workers(ready_path, count)
+        return time.perf_counter() - started
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--port', type=int, default=5055)
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--legacy', action='store_true',
+                        help='no preload or gc.freeze: every worker imports app.py')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        cold_start, usage = measure(args.workers, args.legacy, args.port, args.requests, directory)
+        scale_up = measure_scale_up(args.workers, args.legacy, args.port, directory)
+
+    print(f"mode:                {'legacy' if args.legacy else 'preload + gc.freeze'}")
+    print(f'cold start to first request: {cold_start * 1000:.1f} ms')
+    print(f'scale 1 -> {args.workers} workers:       {scale_up * 1000:.1f} ms')
+    for index, (rss, pss) in enumerate(usage, 1):
+        print(f'worker {index}: rss {rss / 1024:.1f} MiB, pss {pss / 1024:.1f} MiB')
+    print(f'total pss:           {sum(pss for _, pss in usage) / 1024:.1f} MiB')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,37 @@
+# Gunicorn settings for the Flask backend.
+# Run with: gunicorn "app:create_app()"
+import gc
+import os
+
+bind = os.environ.get('BIND', '0.0.0.0:5000')
+# Sessions live in each worker's memory, so a questionnaire only works if every
+# call reaches the worker that started it. Keep one worker unless sessions are
+# moved to shared storage or the load balancer routes by session.
+workers = int(os.environ.get('WEB_CONCURRENCY', '1'))
+
+# Import app.py and build the templates once in the master, then fork
+preload_app = True
+
+# No collections while the app loads: a collection would write to the GC
+# headers of every object it scans and free some of them, leaving holes that
+# later allocations fill in pages the workers share. This file runs again on
+# every SIGHUP reload, so both when_ready (first start) and on_reload (after
+# the reload has preloaded the app) freeze what was loaded and turn collection
+# back on in the master; post_fork also turns it on in every new worker.
+gc.disable()
+
+def when_ready(server):
+    from app import freeze_shared_state
+    freeze_shared_state()
+    gc.enable()
+
+def on_reload(server):
+    when_ready(server)
+
+def pre_fork(server, worker):
+    # Workers started later (e.g. via TTIN) also get the master's newer objects frozen
+    from app import freeze_shared_state
+    freeze_shared_state()
+
+def post_fork(server, worker):
+    gc.enable()
@@ -0,0 +1,254 @@
+"""Off-request rendering of shareable report artifacts.
+
+Request handlers snapshot a report and hand it to a RenderPipeline, which
+renders it on a bounded thread pool and returns a job id straight away.
+Identical requests (same session, report version and format) share one job,
+and finished artifacts are cached by that key. Reports handed to the pipeline
+carry a read-only share_url instead of the session id, which is the
+credential for changing a questionnaire and must not appear in artifacts.
+"""
+import html
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional, Tuple
+
+SMS_LIMIT = 160
+
+class RenderQueueFull(Exception):
+    """Raised when the pipeline already holds its maximum number of jobs"""
+
+def render_html(report: dict) -> dict:
+    """Render a printable HTML summary of a report"""
+    def e(value):
+        return html.escape(str(value))
+
+    answers = ''.join(
+        f'<tr><td>{e(item["question"])}</td><td>{e(item["answer"])}</td></tr>'
+        for item in report['detailed_answers']
+    )
+    recommendations = ''.join(f'<li>{e(item)}</li>' for item in report['recommendations'])
+    medications = ''.join(
+        f'<li><strong>{e(item["name"])}</strong> - {e(item["purpose"])}</li>'
+        for item in report['suggested_medications']
+    )
+    body = (
+        '<!DOCTYPE html><html><head><meta charset="utf-8">'
+        f'<title>Aushadham report - {e(report["symptom"])}</title>'
+        '<style>body{font-family:sans-serif;max-width:48em;margin:auto}'
+        'table{border-collapse:collapse;width:100%}td{border:1px solid #ccc;padding:4px}'
+        '@media print{.no-print{display:none}}</style></head><body>'
+        f'<h1>Symptom assessment: {e(report["symptom"])}</h1>'
+        f'<p>{e(report["initial_description"])}</p>'
+        f'<p>Date: {e(report["assessment_date"])}<br>'
+        f'Severity: <strong>{e(report["severity"])}</strong> (risk score {e(report["risk_score"])})<br>'
+        f'{e(report["urgency"])}</p>'
+        f'<h2>Recommendations</h2><ul>{recommendations}</ul>'
+        f'<h2>Suggested medications</h2><ul>{medications}</ul>'
+        f'<h2>Answers</h2><table>{answers}</table>'
+        f'<p><small>{e(report["disclaimer"])}</small></p>'
+        f'<p><small>View online: <a href="{e(report["share_url"])}">{e(report["share_url"])}</a></small></p>'
+        '</body></html>'
+    )
+    return {'format': 'html', 'content_type': 'text/html; charset=utf-8', 'body': body}
+
+def render_sms(report: dict) -> dict:
+    """Render an SMS-sized digest, with a QR code when the qrcode package is installed"""
+    link = ' ' + report['share_url']
+    digest = (
+        f"Aushadham: {report['symptom']} - {report['severity']} risk "
+        f"(score {report['risk_score']}). {report['urgency']}."
+    )
+    # Shorten the text, never the link
+    room = max(SMS_LIMIT - len(link), 0)
+    if len(digest) > room:
+        digest = digest[:max(room - 3, 0)] + '...'
+    return {
+        'format': 'sms',
+        'content_type': 'text/plain; charset=utf-8',
+        'body': digest + link,
+        'qr_svg': render_qr_svg(report['share_url'])
+    }
+
+def render_qr_svg(data: str) -> Optional[str]:
+    """Encode data as an SVG QR code, or None if qrcode is not installed"""
+    # Imported here so workers that never render pay nothing for it
+    try:
+        import qrcode
+        import qrcode.image.svg
+    except ImportError:
+        return None
+    image = qrcode.make(data, image_factory=qrcode.image.svg.SvgPathImage)
+    return image.to_string(encoding='unicode')
+
+renderers = {
+    'html': render_html,
+    'sms': render_sms
+}
+
+class RenderPipeline:
+    def __init__(self, max_workers: int = 2, max_queue: int = 64,
+                 cache_size: int = 256, max_jobs: int = 1024):
+        self.max_queue = max_queue
+        self.cache_size = cache_size
+        self.max_jobs = max_jobs
+        self._executor = ThreadPoolExecutor(max_workers=max_workers,
+                                            thread_name_prefix='report-render')
+        self._lock = threading.Lock()
+        self._jobs: 'OrderedDict[str, dict]' = OrderedDict()
+        self._pending: Dict[Tuple[str, int, str], str] = {}
+        self._cache: 'OrderedDict[Tuple[str, int, str], dict]' = OrderedDict()
+        # Seconds per finished job: waiting for a pool thread, rendering, and submit to done
+        self._latencies = {
+            'queue_wait': deque(maxlen=1000),
+            'render': deque(maxlen=1000),
+            'total': deque(maxlen=1000)
+        }
+        self._rendered = 0
+        self._failed = 0
+
+    def submit(self, session_id: str, version: int, fmt: str, report_factory) -> dict:
+        """Queue a render and return its job without waiting for it.
+
+        report_factory is only called when nothing cached or in flight
+        already covers (session_id, version, fmt).
+        """
+        if fmt not in renderers:
+            raise ValueError(f'Unknown format: {fmt}')
+        key = (session_id, version, fmt)
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._add_job(key, 'done', cached=True)
+            if key in self._pending:
+                return self._jobs[self._pending[key]]
+            if len(self._pending) >= self.max_queue:
+                raise RenderQueueFull('Render queue is full, try again later')
+            job = self._add_job(key, 'queued')
+            self._pending[key] = job['job_id']
+        try:
+            report = report_factory()
+            self._executor.submit(self._render, job, report)
+        except Exception as e:
+            self._finish(job, error=str(e))
+        return job
+
+    def get(self, job_id: str) -> Optional[dict]:
+        """Return a job and, once done, its cached artifact"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            result = {k: v for k, v in job.items() if k not in ('key', 'submitted')}
+            if job['status'] == 'done':
+                artifact = self._cache.get(job['key'])
+                if artifact is None:
+                    result.update(status='expired')
+                else:
+                    result['artifact'] = artifact
+            return result
+
+    def metrics(self) -> dict:
+        """Queue depth and latency percentiles for queue wait, render and total time"""
+        with self._lock:
+            latencies = {name: sorted(values) for name, values in self._latencies.items()}
+            queued = sum(1 for job_id in self._pending.values()
+                         if self._jobs[job_id]['status'] == 'queued')
+            depth = len(self._pending)
+            rendered, failed, cached = self._rendered, self._failed, len(self._cache)
+
+        def percentile(values, p):
+            if not values:
+                return None
+            return round(values[min(len(values) - 1, int(p * len(values)))] * 1000, 3)
+
+        return {
+            'queue_depth': depth,
+            'queued': queued,
+            'running': depth - queued,
+            'rendered': rendered,
+            'failed': failed,
+            'cached_artifacts': cached,
+            'latency_ms': {
+                name: {
+                    'p50': percentile(values, 0.5),
+                    'p95': percentile(values, 0.95),
+                    'max': percentile(values, 1.0)
+                }
+                for name, values in latencies.items()
+            }
+        }
+
+    def _add_job(self, key, status: str, cached: bool = False) -> dict:
+        job = {
+            'job_id': str(uuid.uuid4()),
+            'key': key,
+            'format': key[2],
+            'status': status,
+            'cached': cached,
+            'error': None,
+            'submitted': time.perf_counter(),
+            'timings_ms': None
+        }
+        self._jobs[job['job_id']] = job
+        if len(self._jobs) > self.max_jobs:
+            # Drop the oldest finished job; queued and running ones must stay reachable
+            for old_id, old_job in self._jobs.items():
+                if old_job['status'] in ('done', 'failed'):
+                    del self._jobs[old_id]
+                    break
+        return job
+
+    def _render(self, job: dict, report: dict):
+        started = time.perf_counter()
+        with self._lock:
+            job['status'] = 'running'
+        try:
+            artifact = renderers[job['format']](report)
+        except Exception as e:
+            self._finish(job, error=str(e))
+        else:
+            self._finish(job, artifact=artifact, started=started)
+
+    def _finish(self, job: dict, artifact: Optional[dict] = None,
+                error: Optional[str] = None, started: Optional[float] = None):
+        finished = time.perf_counter()
+        with self._lock:
+            self._pending.pop(job['key'], None)
+            if error is not None:
+                job.update(status='failed', error=error)
+                self._failed += 1
+                return
+            self._cache[job['key']] = artifact
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+            job['status'] = 'done'
+            self._rendered += 1
+            timings = {
+                'queue_wait': started - job['submitted'],
+                'render': finished - started,
+                'total': finished - job['submitted']
+            }
+            for name, seconds in timings.items():
+                self._latencies[name].append(seconds)
+            job['timings_ms'] = {name: round(seconds * 1000, 3) for name, seconds in timings.items()}
+
+_pipeline: Optional[RenderPipeline] = None
+_pipeline_pid: Optional[int] = None
+_pipeline_lock = threading.Lock()
+
+def get_pipeline() -> RenderPipeline:
+    """Return this process's pipeline, creating it after any fork"""
+    global _pipeline, _pipeline_pid
+    with _pipeline_lock:
+        if _pipeline is None or _pipeline_pid != os.getpid():
+            _pipeline = RenderPipeline(
+                max_workers=int(os.environ.get('RENDER_WORKERS', '2')),
+                max_queue=int(os.environ.get('RENDER_QUEUE_SIZE', '64')),
+                cache_size=int(os.environ.get('RENDER_CACHE_SIZE', '256'))
+            )
+            _pipeline_pid = os.getpid()
+        return _pipeline
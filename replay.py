@@ -0,0 +1,281 @@
+"""Record and replay questionnaire traffic.
+
+Recording: start the server with AUSHADHAM_RECORD=events.jsonl and every call
+to /start_questionnaire, /submit_answer and /get_report is appended to that
+file as one compact JSON line (non-200 responses also carry "c", the status):
+
+    {"ts": 1760900000.123, "s": "9d41c07e5b2a6f13", "e": "start", "sym": "head"}
+    {"ts": 1760900001.456, "s": "9d41c07e5b2a6f13", "e": "answer", "a": "Yes", "act": "skip"}
+    {"ts": 1760900009.789, "s": "9d41c07e5b2a6f13", "e": "report", "h": "3c5e0f9d1a2b4c6d"}
+
+"s" is a keyed 64-bit hash of the session id, so the log holds no usable
+session credential. Requests the endpoint rejects before touching any
+session (a body that is not a JSON object, or a list or object as
+session_id) are logged with "s": null and "x": 1 and are replayed as such.
+
+Free text is anonymized on the way in: symptoms keep only the routing
+keywords they contain, descriptions and unrecognised answers (including any
+non-string value) are redacted, and unknown actions are logged as "other".
+Reports are stored as a hash of their anonymized, time-independent content.
+
+Replaying:
+
+    python replay.py events.jsonl                        # in-process, max speed
+    python replay.py events.jsonl --http http://127.0.0.1:5000 --speed 1
+    python replay.py events.jsonl --http http://127.0.0.1:5000 --speed 0
+
+In-process replay drives QuestionnaireSession directly; HTTP replay sends the
+same calls to a running server (single worker, since sessions live in worker
+memory) at the recorded timing divided by --speed, or as fast as possible
+with --speed 0. Every replayed report is checked against the recorded hash.
+"""
+import argparse
+import hashlib
+import json
+import secrets
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from typing import Dict, List, Optional
+
+from app import (QuestionnaireSession, apply_action, high_risk_answers,
+                 questionnaire_templates, symptom_keywords)
+
+REDACTED = '[redacted]'
+# Stand-in for non-string answers. Anything without .lower() fails the same
+# way in the app, so a non-string marker replays them faithfully.
+REDACTED_VALUE = {'redacted': True}
+
+actions = ('next', 'previous', 'skip')
+
+# Every substring generate_report() or template routing looks for
+symptom_terms = sorted(
+    {word for words in symptom_keywords.values() for word in words}
+    | {'stomach', 'head', 'fever', 'cough'}
+)
+
+# Answers that can be echoed verbatim: the offered options plus the fixed values
+known_answers = {'Yes', 'No', 'Skipped', 'Not answered'}
+# Lower-cased answers that change scoring or branching, kept in that form
+significant_answers = set(high_risk_answers)
+for template in questionnaire_templates.values():
+    for question in template.get('initial_questions', []):
+        known_answers.update(question.get('options', []))
+    for branches in template.get('conditional_questions', {}).values():
+        significant_answers.update(branches)
+        for questions in branches.values():
+            for question in questions:
+                known_answers.update(question.get('options', []))
+
+def anonymize_symptom(symptom) -> str:
+    """Keep only the routing keywords found in a symptom"""
+    symptom = str(symptom).lower()
+    # Keywords never contain spaces, so joining them creates no new matches
+    return ' '.join(term for term in symptom_terms if term in symptom) or REDACTED
+
+def anonymize_answer(answer):
+    """Keep offered options, reduce other text to what affects scoring"""
+    if answer is None:
+        return None
+    if not isinstance(answer, str):
+        return REDACTED_VALUE
+    if answer in known_answers:
+        return answer
+    if answer.lower() in significant_answers:
+        return answer.lower()
+    return REDACTED
+
+def anonymize_action(action):
+    """Keep the known navigation actions; every other value behaves alike"""
+    return action if action in actions else 'other'
+
+def report_hash(report: dict) -> str:
+    """Hash a report's anonymized content, ignoring session id and date"""
+    content = dict(report)
+    content.pop('session_id', None)
+    content.pop('assessment_date', None)
+    content['symptom'] = anonymize_symptom(content['symptom'])
+    content['initial_description'] = REDACTED
+    content['answers'] = {k: anonymize_answer(v) for k, v in content['answers'].items()}
+    content['detailed_answers'] = [
+        dict(item, answer=anonymize_answer(item['answer'])) for item in content['detailed_answers']
+    ]
+    canonical = json.dumps(content, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(canonical.encode()).hexdigest()[:16]
+
+class SessionRecorder:
+    endpoints = {
+        '/start_questionnaire': 'start',
+        '/submit_answer': 'answer',
+        '/get_report': 'report'
+    }
+
+    def __init__(self, path: str):
+        # Append mode keeps each line whole when several workers share the file
+        self._file = open(path, 'a', encoding='utf-8')
+        self._lock = threading.Lock()
+        # Created before gunicorn forks, so every worker hashes ids the same way
+        self._key = secrets.token_bytes(16)
+
+    def session_key(self, session_id) -> str:
+        """Stable 64-bit stand-in for a session id, useless as a credential"""
+        return hashlib.blake2b(str(session_id).encode(), key=self._key, digest_size=8).hexdigest()
+
+    def record(self, request, response):
+        """Append the event for a finished request, if it is one we replay"""
+        kind = self.endpoints.get(request.path)
+        if kind is None:
+            return
+        data = request.get_json(silent=True)
+        # A list or object session_id is unhashable, so the endpoint's session
+        # lookup raises and answers 400 just as for an unreadable body
+        malformed = (not isinstance(data, dict)
+                     or isinstance(data.get('session_id'), (list, dict)))
+        if malformed:
+            data = {}
+        body = response.get_json(silent=True) or {}
+        session_id = body.get('session_id') if kind == 'start' else data.get('session_id')
+
+        event = {'ts': round(time.time(), 3),
+                 's': self.session_key(session_id) if session_id else None,
+                 'e': kind}
+        if malformed:
+            event['x'] = 1
+        elif kind == 'start':
+            event['sym'] = anonymize_symptom(data.get('symptom', ''))
+        elif kind == 'answer':
+            event['a'] = anonymize_answer(data.get('answer'))
+            action = anonymize_action(data.get('action', 'next'))
+            if action != 'next':
+                event['act'] = action
+        elif body.get('success'):
+            event['h'] = report_hash(body['report'])
+        if response.status_code != 200:
+            event['c'] = response.status_code
+
+        line = json.dumps(event, separators=(',', ':'), ensure_ascii=False) + '\n'
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+
+def load_events(path: str) -> List[dict]:
+    """Read an event log, ordered by timestamp"""
+    with open(path, encoding='utf-8') as log:
+        events = [json.loads(line) for line in log if line.strip()]
+    events.sort(key=lambda event: event['ts'])
+    return events
+
+def replay_in_process(events: List[dict]) -> dict:
+    """Drive QuestionnaireSession directly, as fast as possible"""
+    sessions: Dict[str, QuestionnaireSession] = {}
+    mismatches = []
+    started = time.perf_counter()
+    for index, event in enumerate(events):
+        if event['e'] == 'start' and 'c' in event:
+            continue
+        status, report = 200, None
+        session = sessions.get(event['s'])
+        try:
+            if event.get('x'):
+                # The endpoint rejects the request before any session is touched
+                status = 400
+            elif event['e'] == 'start':
+                session = QuestionnaireSession(event['s'], event['sym'], REDACTED)
+                sessions[event['s']] = session
+            elif session is None:
+                status = 404
+            elif event['e'] == 'answer':
+                apply_action(session, event['a'], event.get('act', 'next'))
+            else:
+                report = session.generate_report()
+        except Exception:
+            status = 400
+        check(index, event, status, report, mismatches)
+    return summarize(events, mismatches, time.perf_counter() - started)
+
+def replay_http(events: List[dict], base_url: str, speed: float) -> dict:
+    """Send the recorded calls to a running server"""
+    paths = {kind: path for path, kind in SessionRecorder.endpoints.items()}
+    session_ids: Dict[str, str] = {}
+    mismatches = []
+    lag = 0.0
+    started = time.perf_counter()
+    for index, event in enumerate(events):
+        # A start that failed when recorded left nothing to replay
+        if event['e'] == 'start' and 'c' in event:
+            continue
+        if speed > 0:
+            due = (event['ts'] - events[0]['ts']) / speed
+            delay = due - (time.perf_counter() - started)
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                lag = max(lag, -delay)
+
+        if event.get('x'):
+            payload = None
+        elif event['e'] == 'start':
+            payload = {'symptom': event['sym'], 'description': REDACTED}
+        else:
+            # Unknown sessions get an id the server has never issued
+            payload = {'session_id': session_ids.get(event['s'], 'replay-unknown')}
+            if event['e'] == 'answer':
+                payload.update(answer=event['a'], action=event.get('act', 'next'))
+        status, body = post(base_url + paths[event['e']], payload)
+
+        if event['e'] == 'start' and body.get('session_id'):
+            session_ids[event['s']] = body['session_id']
+        check(index, event, status, body.get('report') if event['e'] == 'report' else None, mismatches)
+    result = summarize(events, mismatches, time.perf_counter() - started)
+    result['max_lag_s'] = round(lag, 3)
+    return result
+
+def post(url: str, payload: Optional[dict]):
+    """POST payload as JSON; None sends a body that is not valid JSON"""
+    data = b'not json' if payload is None else json.dumps(payload).encode()
+    request = urllib.request.Request(url, data=data,
+                                     headers={'Content-Type': 'application/json'})
+    try:
+        with urllib.request.urlopen(request) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read() or b'{}')
+
+def check(index: int, event: dict, status: int, report: Optional[dict], mismatches: list):
+    """Compare one replayed call with its recording"""
+    expected_status = event.get('c', 200)
+    if status != expected_status:
+        mismatches.append({'event': index, 'expected_status': expected_status, 'status': status})
+    elif report is not None and report_hash(report) != event.get('h'):
+        mismatches.append({'event': index, 'expected': event.get('h'), 'got': report_hash(report)})
+
+def summarize(events: List[dict], mismatches: list, elapsed: float) -> dict:
+    return {
+        'events': len(events),
+        'reports': sum(1 for event in events if event['e'] == 'report'),
+        'mismatches': mismatches,
+        'elapsed_s': round(elapsed, 3),
+        'events_per_s': round(len(events) / elapsed, 1) if elapsed else None
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay a recorded questionnaire event log')
+    parser.add_argument('log', help='event log written with AUSHADHAM_RECORD')
+    parser.add_argument('--http', metavar='URL', help='replay against a running server instead of in-process')
+    parser.add_argument('--speed', type=float, default=0,
+                        help='HTTP only: 1 = recorded timing, 2 = twice as fast, 0 = no waiting')
+    parser.add_argument('--repeat', type=int, default=1, help='in-process only: replay the log N times')
+    args = parser.parse_args()
+
+    events = load_events(args.log)
+    if args.http:
+        result = replay_http(events, args.http.rstrip('/'), args.speed)
+    else:
+        result = replay_in_process(events * args.repeat)
+    print(json.dumps(result, indent=2))
+    sys.exit(1 if result['mismatches'] else 0)
+
+if __name__ == '__main__':
+    main()